@@ -1,13 +1,14 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, redirect, make_response
 from flask_cors import CORS
 from celery import Celery
 import os
 import redis
+import msgspec
 from dotenv import load_dotenv
 import uuid
-import json
 from datetime import datetime
 import logging
+import functools
 
 # Load environment variables
 load_dotenv()
@@ -25,7 +26,18 @@ celery = Celery(app.name, broker=app.config['CELERY_BROKER_URL'])
 celery.conf.update(app.config)
 
 # Initialize Redis for job tracking
-redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
+redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'), decode_responses=True)
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    """Create the S3 client on first use, only needed to presign downloads"""
+    import boto3
+    
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+    )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -38,6 +50,17 @@ BIBLE_STORIES = [
     "Jesus' Birth", "Jesus' Baptism", "The Good Samaritan", "Jesus Feeds 5000",
     "Jesus Walks on Water", "The Resurrection", "Paul's Conversion"
 ]
+BIBLE_STORIES_SET = frozenset(BIBLE_STORIES)  # For O(1) membership checks; the list keeps display order
+
+# Accepted video resolutions
+VALID_RESOLUTIONS = frozenset(['HD', 'Full HD', '4K'])
+
+class GenerateRequest(msgspec.Struct):
+    """Body of a /generate request"""
+    story: str
+    duration: int
+    resolution: str
+    tiktok: bool
 
 @app.route('/')
 def index():
@@ -57,27 +80,28 @@ def get_stories():
 def generate_video():
     """Start video generation process"""
     try:
-        data = request.get_json()
-        
-        # Validate input
-        required_fields = ['story', 'duration', 'resolution', 'tiktok']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        # Parse and type-check the body in a single pass
+        try:
+            generate_request = msgspec.json.decode(request.get_data(), type=GenerateRequest)
+        except msgspec.ValidationError as e:
+            return jsonify({'error': f'Invalid request: {str(e)}'}), 400
+        except msgspec.DecodeError:
+            return jsonify({'error': 'Request body must be valid JSON'}), 400
         
         # Validate story
-        if data['story'] not in BIBLE_STORIES:
+        if generate_request.story not in BIBLE_STORIES_SET:
             return jsonify({'error': 'Invalid story selection'}), 400
         
         # Validate duration
-        if not (10 <= data['duration'] <= 25):
+        if not (10 <= generate_request.duration <= 25):
             return jsonify({'error': 'Duration must be between 10 and 25 minutes'}), 400
         
         # Validate resolution
-        valid_resolutions = ['HD', 'Full HD', '4K']
-        if data['resolution'] not in valid_resolutions:
+        if generate_request.resolution not in VALID_RESOLUTIONS:
             return jsonify({'error': 'Invalid resolution'}), 400
         
+        data = msgspec.to_builtins(generate_request)
+        
         # Generate job ID
         job_id = str(uuid.uuid4())
         
@@ -87,14 +111,18 @@ def generate_video():
             'story': data['story'],
             'duration': data['duration'],
             'resolution': data['resolution'],
-            'tiktok': data['tiktok'],
+            'tiktok': int(bool(data['tiktok'])),
             'status': 'queued',
             'progress': 0,
             'created_at': datetime.now().isoformat(),
-            'error': None
+            'error': ''
         }
         
-        redis_client.set(f'job:{job_id}', json.dumps(job_data), ex=3600)  # Expire after 1 hour
+        # Store as a hash so workers can update individual fields
+        pipe = redis_client.pipeline()
+        pipe.hset(f'job:{job_id}', mapping=job_data)
+        pipe.expire(f'job:{job_id}', 3600)  # Expire after 1 hour
+        pipe.execute()
         
         # Start Celery task
         from tasks import generate_video_task
@@ -114,17 +142,19 @@ def generate_video():
 def get_job_status(job_id):
     """Get job status and progress"""
     try:
-        job_data = redis_client.get(f'job:{job_id}')
-        if not job_data:
+        # Fetch only the fields the poll needs
+        status, progress, created_at, error = redis_client.hmget(
+            f'job:{job_id}', 'status', 'progress', 'created_at', 'error'
+        )
+        if status is None:
             return jsonify({'error': 'Job not found'}), 404
         
-        job_info = json.loads(job_data)
         return jsonify({
             'job_id': job_id,
-            'status': job_info['status'],
-            'progress': job_info['progress'],
-            'created_at': job_info['created_at'],
-            'error': job_info.get('error')
+            'status': status,
+            'progress': int(progress or 0),
+            'created_at': created_at,
+            'error': error or None
         })
         
     except Exception as e:
@@ -135,24 +165,44 @@ def get_job_status(job_id):
 def download_video(job_id):
     """Download completed video"""
     try:
-        job_data = redis_client.get(f'job:{job_id}')
-        if not job_data:
+        status, story, s3_key = redis_client.hmget(f'job:{job_id}', 'status', 'story', 's3_key')
+        if status is None:
             return jsonify({'error': 'Job not found'}), 404
         
-        job_info = json.loads(job_data)
-        
-        if job_info['status'] != 'completed':
+        if status != 'completed':
             return jsonify({'error': 'Video not ready for download'}), 400
         
-        # In production, this would download from S3
-        # For now, return the file path
+        download_name = f"{story}.mp4"
+        
+        # Serve from S3 when the upload succeeded, so the worker never streams the bytes
+        if s3_key and os.getenv('S3_BUCKET_NAME'):
+            url = get_s3_client().generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': os.getenv('S3_BUCKET_NAME'),
+                    'Key': s3_key,
+                    'ResponseContentDisposition': f'attachment; filename="{download_name}"'
+                },
+                ExpiresIn=3600
+            )
+            return redirect(url)
+        
         video_path = f"/tmp/videos/{job_id}.mp4"
         
-        if os.path.exists(video_path):
-            return send_file(video_path, as_attachment=True, download_name=f"{job_info['story']}.mp4")
-        else:
+        if not os.path.exists(video_path):
             return jsonify({'error': 'Video file not found'}), 404
         
+        # Behind nginx, hand the transfer off to its internal location (zero-copy sendfile)
+        accel_prefix = os.getenv('NGINX_ACCEL_REDIRECT_PREFIX')
+        if accel_prefix:
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{job_id}.mp4"
+            response.headers['Content-Type'] = 'video/mp4'
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+            return response
+        
+        return send_file(video_path, as_attachment=True, download_name=download_name, conditional=True)
+        
     except Exception as e:
         logger.error(f"Error in download_video: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -1,58 +1,406 @@
-from celery import Celery
+from celery import Celery, chord, group
+from celery.signals import worker_process_init
 import os
+import re
 import json
+import orjson
+import zstandard as zstd
 import redis
 import openai
 import replicate
+from replicate.exceptions import ReplicateError
 from elevenlabs import generate, save, set_api_key
-import boto3
+from elevenlabs.api.error import APIError as ElevenLabsAPIError, RateLimitError as ElevenLabsRateLimitError
 from datetime import datetime
 import logging
 import subprocess
 import time
-from PIL import Image
+import hashlib
+import uuid
+import functools
+import shutil
+import tempfile
 import requests
-from io import BytesIO
+from requests.adapters import HTTPAdapter
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Celery
-celery = Celery('tasks', broker=os.getenv('REDIS_URL', 'redis://localhost:6379'))
+celery = Celery(
+    'tasks',
+    broker=os.getenv('REDIS_URL', 'redis://localhost:6379'),
+    backend=os.getenv('REDIS_URL', 'redis://localhost:6379')  # Required for chords
+)
+celery.conf.update(
+    # Keep broker and result backend connections alive between bursts of scene task dispatches
+    broker_transport_options={'socket_keepalive': True},
+    redis_socket_keepalive=True,
+    
+    # Shrink task payloads (scenes, script data) on the wire
+    task_compression='zstd',
+    
+    # Long-running orchestration and stitching stay on a prefetch-1 queue, while
+    # short scene tasks go to their own queue whose workers prefetch in batches
+    worker_prefetch_multiplier=1,
+    task_routes={
+        'tasks.generate_video_task': {'queue': 'video_generation'},
+        'tasks.stitch_video_task': {'queue': 'video_generation'},
+        'tasks.video_task_failed': {'queue': 'video_generation'},
+        'tasks.generate_image_task': {'queue': 'scenes'},
+        'tasks.generate_voice_task': {'queue': 'scenes'},
+    },
+)
 
 # Initialize Redis client
 redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
 
 # Initialize AI services
-openai.api_key = os.getenv('OPENAI_API_KEY')
 set_api_key(os.getenv('ELEVENLABS_API_KEY'))
 
-# AWS S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    """Create the S3 client on first use, so only workers that upload pay for boto3"""
+    import boto3
+    
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_s3_transfer_config():
+    """Upload large videos as parallel multipart chunks"""
+    from boto3.s3.transfer import TransferConfig
+    
+    return TransferConfig(
+        multipart_threshold=8 * 1024 * 1024,
+        multipart_chunksize=16 * 1024 * 1024,
+        max_concurrency=10,
+        use_threads=True
+    )
+
+# Resolution mapping
+RESOLUTION_MAP = {
+    'HD': '1280x720',
+    'Full HD': '1920x1080',
+    '4K': '3840x2160'
+}
+
+def create_http_session():
+    """Create an HTTP session whose keep-alive connections are reused across downloads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def create_api_clients():
+    """Create the OpenAI client, Replicate client and HTTP session shared by tasks"""
+    return (
+        # An empty key defers the missing-key error to the first request, as before.
+        # SDK retries are off so they don't multiply with api_retry.
+        openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY', ''), max_retries=0),
+        replicate.Client(api_token=os.getenv('REPLICATE_API_TOKEN')),
+        create_http_session()
+    )
+
+# Long-lived clients so each call reuses DNS lookups and TLS connections
+openai_client, replicate_client, http_session = create_api_clients()
+
+@worker_process_init.connect
+def init_worker_clients(**kwargs):
+    """Recreate the shared clients after fork so worker processes never share sockets"""
+    global openai_client, replicate_client, http_session
+    openai_client, replicate_client, http_session = create_api_clients()
+    get_s3_client.cache_clear()
+
+class RedisSemaphore:
+    """Concurrency limit shared by every worker process, backed by a Redis sorted set"""
+    
+    def __init__(self, name, limit, lease_seconds=600):
+        self.key = f'semaphore:{name}'
+        self.limit = limit
+        # Holders that crash without releasing lose their slot after the lease
+        self.lease_seconds = lease_seconds
+    
+    def __enter__(self):
+        self.token = str(uuid.uuid4())
+        if self.limit <= 0:
+            return self
+        while True:
+            now = time.time()
+            pipe = redis_client.pipeline()
+            pipe.zremrangebyscore(self.key, '-inf', now - self.lease_seconds)
+            pipe.zadd(self.key, {self.token: now})
+            pipe.zrank(self.key, self.token)
+            pipe.expire(self.key, self.lease_seconds)
+            rank = pipe.execute()[2]
+            # Earliest requesters hold the slots; anyone past the limit backs off and retries
+            if rank is not None and rank < self.limit:
+                return self
+            redis_client.zrem(self.key, self.token)
+            time.sleep(0.5)
+    
+    def __exit__(self, *exc_info):
+        if self.limit > 0:
+            redis_client.zrem(self.key, self.token)
+
+class RateLimiter:
+    """Token bucket shared by every worker process, limiting units (characters, tokens) per minute"""
+    
+    # Refill the bucket and take `units` if available, else return the seconds to wait
+    script = redis_client.register_script("""
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local units = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= units then
+    tokens = tokens - units
+else
+    wait = (units - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+""")
+    
+    def __init__(self, name, units_per_minute):
+        self.key = f'ratelimit:{name}'
+        self.capacity = units_per_minute
+        self.rate = units_per_minute / 60.0
+    
+    def acquire(self, units):
+        """Block until `units` of quota are available"""
+        if self.capacity <= 0:
+            return
+        units = min(units, self.capacity)
+        while True:
+            wait = float(self.script(keys=[self.key], args=[self.capacity, self.rate, time.time(), units]))
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+# Limits shared across all scene workers, since each task runs in its own process
+replicate_semaphore = RedisSemaphore('replicate', int(os.getenv('REPLICATE_MAX_CONCURRENCY', '4')))
+elevenlabs_limiter = RateLimiter('elevenlabs', int(os.getenv('ELEVENLABS_CHARS_PER_MINUTE', '0')))
+openai_limiter = RateLimiter('openai', int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '0')))
+
+# Replicate raises a bare ReplicateError(detail) for every 4xx/5xx, so throttling and
+# server errors can only be recognised from the detail text
+REPLICATE_TRANSIENT_DETAIL = re.compile(
+    r'throttled|rate limit|too many requests|internal server error|bad gateway|'
+    r'service unavailable|gateway timeout|temporarily unavailable',
+    re.IGNORECASE
+)
+REPLICATE_RETRY_AFTER = re.compile(r'available in (\d+(?:\.\d+)?) second', re.IGNORECASE)
+
+def wait_retry_after(retry_state):
+    """Honor a Retry-After header when the API sends one, else back off exponentially"""
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('retry-after')
+    if retry_after is None and isinstance(exc, ReplicateError):
+        # "Request was throttled. Expected available in 6 seconds."
+        match = REPLICATE_RETRY_AFTER.search(str(exc))
+        retry_after = match.group(1) if match else None
+    try:
+        return min(float(retry_after), 60)
+    except (TypeError, ValueError):
+        return wait_random_exponential(min=1, max=60)(retry_state)
+
+# ElevenLabs reports overload through its error status rather than an HTTP code
+ELEVENLABS_TRANSIENT_STATUSES = frozenset(['too_many_concurrent_requests', 'system_busy'])
+
+def is_transient_status(status_code):
+    """Whether an HTTP status code signals a rate limit or server error"""
+    return status_code == 429 or status_code >= 500
+
+def is_transient_error(exc):
+    """Whether a failed API call is worth retrying (rate limits, 5xx, dropped connections)"""
+    # Dropped connections and timeouts from requests (image downloads, ElevenLabs)
+    # and httpx (OpenAI, Replicate)
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return True
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    # The ElevenLabs and Replicate SDKs parse error bodies as JSON, so an HTML page
+    # from a failing gateway surfaces as a decode error
+    if isinstance(exc, json.JSONDecodeError):
+        return True
+    if isinstance(exc, ReplicateError):
+        return bool(REPLICATE_TRANSIENT_DETAIL.search(str(exc)))
+    # ElevenLabs' RateLimitError means the quota is exhausted, which retrying cannot fix
+    if isinstance(exc, ElevenLabsAPIError) and not isinstance(exc, ElevenLabsRateLimitError):
+        # Without a JSON detail the SDK reports the HTTP status code as the status
+        if exc.status.isdigit():
+            return is_transient_status(int(exc.status))
+        return exc.status in ELEVENLABS_TRANSIENT_STATUSES
+    
+    # HTTP errors exposing a status code (OpenAI status errors, requests HTTPError)
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status_code is not None and is_transient_status(status_code)
+
+# Retry policy for transient failures from external APIs; permanent errors
+# (bad requests, auth, quota, model errors, local I/O) fail immediately
+api_retry = retry(
+    retry=retry_if_exception(is_transient_error),
+    wait=wait_retry_after,
+    stop=stop_after_attempt(5),
+    reraise=True
 )
 
+# How long generated scripts and assets stay reusable across jobs
+CACHE_TTL = 7 * 24 * 3600
+
+def cache_key(prefix, *parts):
+    """Build a Redis cache key from a hash of the inputs that determine the result"""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=16).hexdigest()
+    return f'{prefix}:{digest}'
+
+# Leading byte of cached payloads, so the encoding can change without flushing Redis
+CACHE_RAW = b'\x00'
+CACHE_ZSTD = b'\x01'
+CACHE_COMPRESS_MIN_BYTES = 1024
+
+def encode_cache_value(value):
+    """Serialize a value, compressing payloads large enough to benefit"""
+    payload = orjson.dumps(value)
+    if len(payload) < CACHE_COMPRESS_MIN_BYTES:
+        return CACHE_RAW + payload
+    return CACHE_ZSTD + zstd.compress(payload, 3)
+
+def decode_cache_value(data):
+    """Inverse of encode_cache_value; unprefixed data is plain JSON from older workers"""
+    prefix, payload = data[:1], data[1:]
+    if prefix == CACHE_ZSTD:
+        return orjson.loads(zstd.decompress(payload))
+    if prefix == CACHE_RAW:
+        return orjson.loads(payload)
+    return orjson.loads(data)
+
+def get_cached(key):
+    """Return a cached value, or None on a miss or Redis error"""
+    try:
+        cached = redis_client.get(key)
+        return decode_cache_value(cached) if cached else None
+    except Exception as e:
+        logger.error(f"Error reading cache: {str(e)}")
+        return None
+
+def set_cached(key, value):
+    """Cache a value without letting Redis errors fail the job"""
+    try:
+        redis_client.set(key, encode_cache_value(value), ex=CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error writing cache: {str(e)}")
+
+# Last (time, ISO string) pair, reused for updates within the same second
+timestamp_cache = [0.0, '']
+
+def now_iso():
+    """Return the current time as an ISO string, formatted at most once per second"""
+    now = time.time()
+    if now - timestamp_cache[0] > 1.0:
+        timestamp_cache[:] = [now, datetime.fromtimestamp(now).isoformat()]
+    return timestamp_cache[1]
+
+# Set hash fields and refresh the expiry atomically, but only if the job still exists,
+# so updates for expired or unknown jobs never recreate a partial record
+update_job_script = redis_client.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+""")
+
+def update_job_fields(job_id, fields):
+    """Write only the given job fields in a single round trip"""
+    args = [3600]
+    for field, value in fields.items():
+        args += [field, value]
+    update_job_script(keys=[f'job:{job_id}'], args=args)
+
 def update_job_progress(job_id, status, progress, error=None):
     """Update job progress in Redis"""
     try:
-        job_data = redis_client.get(f'job:{job_id}')
-        if job_data:
-            job_info = json.loads(job_data)
-            job_info['status'] = status
-            job_info['progress'] = progress
-            if error:
-                job_info['error'] = error
-            job_info['updated_at'] = datetime.now().isoformat()
-            redis_client.set(f'job:{job_id}', json.dumps(job_info), ex=3600)
+        fields = {
+            'status': status,
+            'progress': progress,
+            'updated_at': now_iso()
+        }
+        if error:
+            fields['error'] = error
+        
+        update_job_fields(job_id, fields)
     except Exception as e:
         logger.error(f"Error updating job progress: {str(e)}")
 
+# Count a finished scene task and advance progress through the scene phase (20-60%),
+# never moving it backwards when tasks finish out of order
+complete_scene_script = redis_client.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local done = redis.call('HINCRBY', KEYS[1], 'scenes_done', 1)
+local total = tonumber(redis.call('HGET', KEYS[1], 'scenes_total')) or 0
+if total > 0 then
+    local progress = 20 + math.floor(40 * math.min(done, total) / total)
+    if progress > (tonumber(redis.call('HGET', KEYS[1], 'progress')) or 0) then
+        redis.call('HSET', KEYS[1], 'progress', progress, 'updated_at', ARGV[1])
+    end
+end
+return done
+""")
+
+def record_scene_complete(job_id):
+    """Advance job progress after a scene image or voiceover finishes"""
+    try:
+        complete_scene_script(keys=[f'job:{job_id}'], args=[now_iso()])
+    except Exception as e:
+        logger.error(f"Error recording scene progress: {str(e)}")
+
+@api_retry
+def create_script_completion(prompt):
+    """Request a script completion from OpenAI"""
+    # Reserve the prompt (roughly 4 characters per token) plus the completion budget
+    openai_limiter.acquire(len(prompt) // 4 + 2000)
+    
+    response = openai_client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are a biblical storyteller creating engaging video scripts."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=2000,
+        temperature=0.7
+    )
+    return response.choices[0].message.content
+
 def generate_script(story, duration, tiktok_format=False):
     """Generate script using OpenAI API"""
     try:
+        # Scripts only depend on these inputs, so reuse one generated earlier
+        key = cache_key('script', story, duration, tiktok_format)
+        cached = get_cached(key)
+        if cached:
+            logger.info(f"Using cached script for {story}")
+            return cached
+        
         # Adjust script based on format
         format_instruction = "short-form, engaging TikTok" if tiktok_format else "detailed narrative"
         
@@ -83,23 +431,14 @@ def generate_script(story, duration, tiktok_format=False):
         }}
         """
         
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a biblical storyteller creating engaging video scripts."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
-        
-        script_content = response.choices[0].message.content
+        script_content = create_script_completion(prompt)
         
         # Parse JSON response
         try:
-            script_data = json.loads(script_content)
+            script_data = orjson.loads(script_content)
+            set_cached(key, script_data)
             return script_data
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             # Fallback parsing if JSON is malformed
             return {
                 "title": story,
@@ -117,140 +456,193 @@ def generate_script(story, duration, tiktok_format=False):
         logger.error(f"Error generating script: {str(e)}")
         raise
 
-def generate_images(scenes, resolution):
-    """Generate images using Replicate Stable Diffusion"""
+@api_retry
+def run_stable_diffusion(prompt, dimensions):
+    """Generate an image with Replicate's Stable Diffusion and return its URL"""
+    # Bounded by the account's concurrency limit
+    with replicate_semaphore:
+        output = replicate_client.run(
+            "stability-ai/stable-diffusion:27b93a2413e7f36cd83da926f3656280b2931564ff050bf9575f1fdf9bcd7478",
+            input={
+                "prompt": prompt,
+                "negative_prompt": "inappropriate content, violence, scary, dark",
+                "width": int(dimensions.split('x')[0]),
+                "height": int(dimensions.split('x')[1]),
+                "num_inference_steps": 50,
+                "guidance_scale": 7.5,
+                "scheduler": "K_EULER"
+            }
+        )
+    return output[0] if isinstance(output, list) else output
+
+@api_retry
+def download_image(image_url, image_path):
+    """Download a generated image to disk"""
+    # Stream straight to disk instead of buffering the whole image in memory
+    with http_session.get(image_url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        
+        with open(image_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+
+def render_scene(job_id, scene, dimensions):
+    """Generate and download the image for a single scene"""
+    scene_number = scene['scene_number']
     try:
-        generated_images = []
+        # Enhanced prompt for biblical scenes
+        enhanced_prompt = f"""
+        Biblical art style, {scene['image_description']}, 
+        cinematic composition, warm lighting, ancient Middle Eastern setting,
+        highly detailed, dramatic atmosphere, religious art style,
+        no text, family-friendly content
+        """
         
-        # Resolution mapping
-        resolution_map = {
-            'HD': '1280x720',
-            'Full HD': '1920x1080',
-            '4K': '3840x2160'
-        }
+        # Reuse an image already rendered for the same prompt and size
+        key = cache_key('image', enhanced_prompt, dimensions)
+        image_path = get_cached(key)
+        if image_path and os.path.exists(image_path):
+            logger.info(f"Using cached image for scene {scene_number}")
+            return {
+                'scene_number': scene_number,
+                'image_path': image_path,
+                'duration': scene['duration']
+            }
         
-        dimensions = resolution_map.get(resolution, '1920x1080')
+        image_url = run_stable_diffusion(enhanced_prompt, dimensions)
         
-        for i, scene in enumerate(scenes):
-            try:
-                # Enhanced prompt for biblical scenes
-                enhanced_prompt = f"""
-                Biblical art style, {scene['image_description']}, 
-                cinematic composition, warm lighting, ancient Middle Eastern setting,
-                highly detailed, dramatic atmosphere, religious art style,
-                no text, family-friendly content
-                """
-                
-                # Use Replicate's Stable Diffusion
-                output = replicate.run(
-                    "stability-ai/stable-diffusion:27b93a2413e7f36cd83da926f3656280b2931564ff050bf9575f1fdf9bcd7478",
-                    input={
-                        "prompt": enhanced_prompt,
-                        "negative_prompt": "inappropriate content, violence, scary, dark",
-                        "width": int(dimensions.split('x')[0]),
-                        "height": int(dimensions.split('x')[1]),
-                        "num_inference_steps": 50,
-                        "guidance_scale": 7.5,
-                        "scheduler": "K_EULER"
-                    }
-                )
-                
-                # Download and save image
-                image_url = output[0] if isinstance(output, list) else output
-                response = requests.get(image_url)
-                
-                if response.status_code == 200:
-                    image_path = f"/tmp/images/scene_{i+1}.png"
-                    os.makedirs("/tmp/images", exist_ok=True)
-                    
-                    with open(image_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    generated_images.append({
-                        'scene_number': scene['scene_number'],
-                        'image_path': image_path,
-                        'duration': scene['duration']
-                    })
-                    
-                    logger.info(f"Generated image for scene {i+1}")
-                else:
-                    raise Exception(f"Failed to download image for scene {i+1}")
-                    
-            except Exception as e:
-                logger.error(f"Error generating image for scene {i+1}: {str(e)}")
-                # Use placeholder image
-                generated_images.append({
-                    'scene_number': scene['scene_number'],
-                    'image_path': None,
-                    'duration': scene['duration']
-                })
+        # Download and save image
+        image_path = f"/tmp/images/{job_id}_scene_{scene_number}.png"
+        download_image(image_url, image_path)
+        set_cached(key, image_path)
         
-        return generated_images
+        logger.info(f"Generated image for scene {scene_number}")
+        return {
+            'scene_number': scene_number,
+            'image_path': image_path,
+            'duration': scene['duration']
+        }
         
     except Exception as e:
-        logger.error(f"Error generating images: {str(e)}")
-        raise
+        logger.error(f"Error generating image for scene {scene_number}: {str(e)}")
+        # Use placeholder image
+        return {
+            'scene_number': scene_number,
+            'image_path': None,
+            'duration': scene['duration']
+        }
+
+@api_retry
+def synthesize_narration(text):
+    """Generate narration audio with ElevenLabs"""
+    # Wait for enough of the per-minute character quota
+    elevenlabs_limiter.acquire(len(text))
+    
+    return generate(
+        text=text,
+        voice="Adam",  # Using Adam voice as specified
+        model="eleven_multilingual_v2"
+    )
 
-def generate_voiceover(script_data):
-    """Generate voiceover using ElevenLabs"""
+def voice_scene(job_id, scene):
+    """Generate and save the voiceover for a single scene"""
+    scene_number = scene['scene_number']
     try:
-        audio_files = []
+        # Reuse audio already synthesized for the same narration
+        key = cache_key('audio', scene['narration'])
+        cached = get_cached(key)
+        if cached and os.path.exists(cached['audio_path']):
+            logger.info(f"Using cached voiceover for scene {scene_number}")
+            return {
+                'scene_number': scene_number,
+                'audio_path': cached['audio_path'],
+                'duration': cached['duration']
+            }
         
-        for i, scene in enumerate(script_data['scenes']):
-            try:
-                # Generate audio for each scene
-                audio = generate(
-                    text=scene['narration'],
-                    voice="Adam",  # Using Adam voice as specified
-                    model="eleven_multilingual_v2"
-                )
-                
-                # Save audio file
-                audio_path = f"/tmp/audio/scene_{i+1}.wav"
-                os.makedirs("/tmp/audio", exist_ok=True)
-                
-                save(audio, audio_path)
-                
-                audio_files.append({
-                    'scene_number': scene['scene_number'],
-                    'audio_path': audio_path,
-                    'duration': len(audio) / 22050  # Approximate duration
-                })
-                
-                logger.info(f"Generated voiceover for scene {i+1}")
-                
-            except Exception as e:
-                logger.error(f"Error generating voiceover for scene {i+1}: {str(e)}")
-                audio_files.append({
-                    'scene_number': scene['scene_number'],
-                    'audio_path': None,
-                    'duration': scene['duration']
-                })
+        # Generate audio for the scene
+        audio = synthesize_narration(scene['narration'])
+        
+        # Save audio file
+        audio_path = f"/tmp/audio/{job_id}_scene_{scene_number}.wav"
+        save(audio, audio_path)
         
-        return audio_files
+        duration = len(audio) / 22050  # Approximate duration
+        set_cached(key, {'audio_path': audio_path, 'duration': duration})
+        
+        logger.info(f"Generated voiceover for scene {scene_number}")
+        return {
+            'scene_number': scene_number,
+            'audio_path': audio_path,
+            'duration': duration
+        }
         
     except Exception as e:
-        logger.error(f"Error generating voiceover: {str(e)}")
-        raise
+        logger.error(f"Error generating voiceover for scene {scene_number}: {str(e)}")
+        return {
+            'scene_number': scene_number,
+            'audio_path': None,
+            'duration': scene['duration']
+        }
+
+@api_retry
+def upload_to_s3(path, bucket, key):
+    """Upload a file to S3"""
+    get_s3_client().upload_file(path, bucket, key, Config=get_s3_transfer_config(), ExtraArgs={'ContentType': 'video/mp4'})
+
+# Hardware H.264 encoders in order of preference, with their encoder options
+HARDWARE_ENCODERS = {
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'p1', '-tune', 'll', '-rc', 'cbr'],
+    'h264_qsv': ['-c:v', 'h264_qsv', '-preset', 'veryfast'],
+    'h264_videotoolbox': ['-c:v', 'h264_videotoolbox'],
+}
+
+@functools.lru_cache(maxsize=None)
+def video_encoder_args():
+    """Pick the fastest H.264 encoder that actually works on this machine"""
+    try:
+        encoders = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True
+        ).stdout
+    except Exception as e:
+        logger.error(f"Error listing FFmpeg encoders: {str(e)}")
+        encoders = ''
+    
+    for encoder, args in HARDWARE_ENCODERS.items():
+        if encoder not in encoders:
+            continue
+        # Builds often list encoders whose hardware is missing, so try a tiny encode
+        probe = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-f', 'lavfi', '-i', 'color=size=256x256',
+             '-frames:v', '1', '-pix_fmt', 'yuv420p', *args, '-f', 'null', '-'],
+            capture_output=True, text=True
+        )
+        if probe.returncode == 0:
+            logger.info(f"Using hardware video encoder {encoder}")
+            return args
+    
+    return ['-c:v', 'libx264']
 
-def stitch_video(script_data, images, audio_files, resolution, tiktok_format, output_path):
+def probe_duration(path):
+    """Return the duration of a media file in seconds"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'default=noprint_wrappers=1:nokey=1', path],
+        capture_output=True, text=True
+    )
+    return float(result.stdout.strip())
+
+def stitch_video(script_data, images, audio_files, resolution, tiktok_format, output_path, job_id=None):
     """Stitch together video using FFmpeg"""
     try:
-        # Create temporary video segments
-        os.makedirs("/tmp/video_segments", exist_ok=True)
-        
-        # Resolution settings
-        resolution_map = {
-            'HD': '1280x720',
-            'Full HD': '1920x1080',
-            '4K': '3840x2160'
-        }
-        
-        dimensions = resolution_map.get(resolution, '1920x1080')
+        dimensions = RESOLUTION_MAP.get(resolution, '1920x1080')
+        width, height = dimensions.split('x')
         aspect_ratio = "9:16" if tiktok_format else "16:9"
         
-        # Create video segments for each scene
-        segment_paths = []
+        # Build one input pair and one filter chain per scene
+        inputs = []
+        filters = []
+        streams = []
+        total_duration = 0.0
         
         for i, scene in enumerate(script_data['scenes']):
             try:
@@ -258,110 +650,169 @@ def stitch_video(script_data, images, audio_files, resolution, tiktok_format, ou
                 audio_path = next((audio['audio_path'] for audio in audio_files if audio['scene_number'] == scene['scene_number']), None)
                 
                 if image_path and audio_path and os.path.exists(image_path) and os.path.exists(audio_path):
-                    segment_path = f"/tmp/video_segments/segment_{i+1}.mp4"
+                    duration = probe_duration(audio_path)
+                    total_duration += duration
+                    index = len(streams)
                     
-                    # FFmpeg command to create video segment
-                    cmd = [
-                        'ffmpeg', '-y',
-                        '-loop', '1',
-                        '-i', image_path,
-                        '-i', audio_path,
-                        '-c:v', 'libx264',
-                        '-c:a', 'aac',
-                        '-b:a', '192k',
-                        '-pix_fmt', 'yuv420p',
-                        '-shortest',
-                        '-vf', f'scale={dimensions}:force_original_aspect_ratio=increase,crop={dimensions}',
-                        segment_path
+                    inputs += [
+                        '-loop', '1', '-framerate', '30', '-t', f'{duration:.3f}', '-i', image_path,
+                        '-i', audio_path
                     ]
+                    filters.append(
+                        f'[{2 * index}:v]scale={width}:{height}:force_original_aspect_ratio=increase,'
+                        f'crop={width}:{height},setsar=1,format=yuv420p[v{index}]'
+                    )
+                    filters.append(
+                        f'[{2 * index + 1}:a]aresample=48000,aformat=channel_layouts=stereo[a{index}]'
+                    )
+                    streams.append(f'[v{index}][a{index}]')
                     
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    
-                    if result.returncode == 0:
-                        segment_paths.append(segment_path)
-                        logger.info(f"Created video segment {i+1}")
-                    else:
-                        logger.error(f"FFmpeg error for segment {i+1}: {result.stderr}")
-                        
             except Exception as e:
-                logger.error(f"Error creating video segment {i+1}: {str(e)}")
-        
-        # Concatenate all segments
-        if segment_paths:
-            # Create file list for FFmpeg concat
-            concat_file = "/tmp/concat_list.txt"
-            with open(concat_file, 'w') as f:
-                for segment_path in segment_paths:
-                    f.write(f"file '{segment_path}'\n")
+                logger.error(f"Error preparing scene {i+1} for stitching: {str(e)}")
+        
+        if not streams:
+            logger.error("No video segments to concatenate")
+            return False
+        
+        # Scale and concatenate every scene in a single encode, with no intermediate segment files
+        filters.append(f"{''.join(streams)}concat=n={len(streams)}:v=1:a=1[v][a]")
+        
+        cmd = [
+            'ffmpeg', '-y',
+            '-loglevel', 'error',
+            '-nostats',
+            '-progress', 'pipe:1',
+            *inputs,
+            '-filter_complex', ';'.join(filters),
+            '-map', '[v]',
+            '-map', '[a]',
+            *video_encoder_args(),
+            '-r', '30',
+            '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-movflags', '+faststart',
+            output_path
+        ]
+        
+        # Stream FFmpeg's progress report instead of buffering its whole output;
+        # errors go to a temp file so a chatty stderr can never block the pipe
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+            last_progress = None
             
-            # Final concatenation command
-            cmd = [
-                'ffmpeg', '-y',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_file,
-                '-c', 'copy',
-                output_path
-            ]
+            for line in proc.stdout:
+                key, _, value = line.strip().partition('=')
+                if key != 'out_time_us' or not job_id or total_duration <= 0:
+                    continue
+                try:
+                    fraction = min(int(value) / 1e6 / total_duration, 1.0)
+                except ValueError:
+                    continue  # out_time_us is N/A until the first frame is written
+                
+                # Stitching spans 60-90% of overall job progress
+                progress = 60 + int(30 * fraction)
+                if progress != last_progress:
+                    update_job_progress(job_id, 'processing', progress)
+                    last_progress = progress
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            returncode = proc.wait()
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info("Video stitching completed successfully")
                 return True
             else:
-                logger.error(f"FFmpeg concatenation error: {result.stderr}")
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode(errors='replace')
+                logger.error(f"FFmpeg error while stitching video: {stderr}")
                 return False
-        else:
-            logger.error("No video segments to concatenate")
-            return False
             
     except Exception as e:
         logger.error(f"Error stitching video: {str(e)}")
         return False
 
+# Directories holding per-scene assets, which the cache points at for CACHE_TTL
+SCENE_ASSET_DIRS = ['/tmp/images', '/tmp/audio']
+# How often any worker sweeps the asset directories
+PRUNE_INTERVAL = 3600
+
+def prune_scene_assets():
+    """Delete scene assets old enough that no cache entry can still reference them"""
+    try:
+        # Cache entries are written right after their file, so a file older than
+        # CACHE_TTL has outlived every entry pointing at it
+        if not redis_client.set('prune:scene_assets', 1, nx=True, ex=PRUNE_INTERVAL):
+            return
+        cutoff = time.time() - CACHE_TTL
+        removed = 0
+        for directory in SCENE_ASSET_DIRS:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} expired scene assets")
+    except Exception as e:
+        logger.error(f"Error pruning scene assets: {str(e)}")
+
 @celery.task
-def generate_video_task(job_id, request_data):
-    """Main task to generate video"""
+def generate_image_task(job_id, scene, resolution):
+    """Generate the image for a single scene"""
+    os.makedirs("/tmp/images", exist_ok=True)
+    dimensions = RESOLUTION_MAP.get(resolution, '1920x1080')
+    image = render_scene(job_id, scene, dimensions)
+    record_scene_complete(job_id)
+    return image
+
+@celery.task
+def generate_voice_task(job_id, scene):
+    """Generate the voiceover for a single scene"""
+    os.makedirs("/tmp/audio", exist_ok=True)
+    audio = voice_scene(job_id, scene)
+    record_scene_complete(job_id)
+    return audio
+
+@celery.task
+def stitch_video_task(scene_assets, job_id, request_data, script_data):
+    """Stitch the per-scene assets into the final video once they have all landed"""
     try:
-        logger.info(f"Starting video generation for job {job_id}")
-        
-        # Extract parameters
-        story = request_data['story']
-        duration = request_data['duration']
-        resolution = request_data['resolution']
-        tiktok_format = request_data['tiktok']
-        
-        # Step 1: Generate script (20% progress)
-        update_job_progress(job_id, 'processing', 10)
-        logger.info(f"Generating script for {story}")
-        script_data = generate_script(story, duration, tiktok_format)
-        update_job_progress(job_id, 'processing', 20)
+        update_job_progress(job_id, 'processing', 60)
         
-        # Step 2: Generate images (40% progress)
-        logger.info("Generating images")
-        images = generate_images(script_data['scenes'], resolution)
-        update_job_progress(job_id, 'processing', 40)
+        images = [asset for asset in scene_assets if 'image_path' in asset]
+        audio_files = [asset for asset in scene_assets if 'audio_path' in asset]
         
-        # Step 3: Generate voiceover (60% progress)
-        logger.info("Generating voiceover")
-        audio_files = generate_voiceover(script_data)
-        update_job_progress(job_id, 'processing', 60)
+        # Scene workers hand over local paths, so every queue must share /tmp/images and
+        # /tmp/audio; fail loudly rather than stitching a video with scenes missing
+        missing = [
+            path for asset in scene_assets
+            for path in (asset.get('image_path'), asset.get('audio_path'))
+            if path and not os.path.exists(path)
+        ]
+        if missing:
+            update_job_progress(job_id, 'failed', 0, 'Scene assets are not available to the stitching worker')
+            logger.error(f"Scene assets missing for job {job_id}: {', '.join(missing)}")
+            return
         
-        # Step 4: Stitch video (80% progress)
+        # Step 3: Stitch video (90% progress)
         logger.info("Stitching video")
         os.makedirs("/tmp/videos", exist_ok=True)
         output_path = f"/tmp/videos/{job_id}.mp4"
         
-        success = stitch_video(script_data, images, audio_files, resolution, tiktok_format, output_path)
+        success = stitch_video(script_data, images, audio_files, request_data['resolution'], request_data['tiktok'], output_path, job_id)
         
         if success:
             update_job_progress(job_id, 'processing', 90)
             
-            # Step 5: Upload to S3 (if configured)
+            # Step 4: Upload to S3 (if configured)
             if os.getenv('S3_BUCKET_NAME'):
                 try:
-                    s3_client.upload_file(output_path, os.getenv('S3_BUCKET_NAME'), f"videos/{job_id}.mp4")
+                    s3_key = f"videos/{job_id}.mp4"
+                    upload_to_s3(output_path, os.getenv('S3_BUCKET_NAME'), s3_key)
+                    # Lets the API redirect downloads to S3 instead of streaming the file itself
+                    update_job_fields(job_id, {'s3_key': s3_key})
                     logger.info("Video uploaded to S3")
                 except Exception as e:
                     logger.error(f"Error uploading to S3: {str(e)}")
@@ -370,10 +821,58 @@ def generate_video_task(job_id, request_data):
             update_job_progress(job_id, 'completed', 100)
             logger.info(f"Video generation completed for job {job_id}")
             
+            prune_scene_assets()
+            
         else:
             update_job_progress(job_id, 'failed', 0, 'Video stitching failed')
             logger.error(f"Video generation failed for job {job_id}")
         
+    except Exception as e:
+        logger.error(f"Error in video stitching task: {str(e)}")
+        update_job_progress(job_id, 'failed', 0, str(e))
+
+@celery.task
+def video_task_failed(request, exc, traceback, job_id):
+    """Mark the job as failed when a scene task or the stitching task errors out"""
+    logger.error(f"Video generation failed for job {job_id}: {str(exc)}")
+    update_job_progress(job_id, 'failed', 0, str(exc))
+
+@celery.task
+def generate_video_task(job_id, request_data):
+    """Main task to generate video"""
+    try:
+        logger.info(f"Starting video generation for job {job_id}")
+        
+        # Extract parameters
+        story = request_data['story']
+        duration = request_data['duration']
+        resolution = request_data['resolution']
+        tiktok_format = request_data['tiktok']
+        
+        # Step 1: Generate script (20% progress)
+        update_job_progress(job_id, 'processing', 10)
+        logger.info(f"Generating script for {story}")
+        script_data = generate_script(story, duration, tiktok_format)
+        update_job_progress(job_id, 'processing', 20)
+        
+        # Step 2: Generate images and voiceover for every scene concurrently,
+        # then stitch once all scene assets have landed (60% progress).
+        # Each finished scene task advances progress; see record_scene_complete.
+        # The group publishes every scene task over a single broker producer.
+        logger.info("Generating images and voiceover")
+        update_job_fields(job_id, {'scenes_total': 2 * len(script_data['scenes']), 'scenes_done': 0})
+        scene_tasks = group(
+            task
+            for scene in script_data['scenes']
+            for task in (
+                generate_image_task.s(job_id, scene, resolution),
+                generate_voice_task.s(job_id, scene),
+            )
+        )
+        stitch = stitch_video_task.s(job_id, request_data, script_data)
+        stitch.on_error(video_task_failed.s(job_id))
+        chord(scene_tasks)(stitch)
+        
     except Exception as e:
         logger.error(f"Error in video generation task: {str(e)}")
-        update_job_progress(job_id, 'failed', 0, str(e))
\ No newline at end of file
+        update_job_progress(job_id, 'failed', 0, str(e))
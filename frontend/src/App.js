@@ -75,18 +75,16 @@ function App() {
 
   const handleDownload = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/download/${jobId}`, {
-        responseType: 'blob'
-      });
-      
-      const url = window.URL.createObjectURL(new Blob([response.data]));
-      const link = document.createElement('a');
-      link.href = url;
-      link.setAttribute('download', `${formData.story}.mp4`);
-      document.body.appendChild(link);
-      link.click();
-      link.remove();
-      window.URL.revokeObjectURL(url);
+      // Check the job first so an expired or unfinished job shows an error
+      // instead of replacing the page with the API's JSON response
+      const response = await axios.get(`${API_BASE_URL}/status/${jobId}`);
+      if (response.data.status !== 'completed') {
+        setError('Failed to download video');
+        return;
+      }
+      // Navigate instead of fetching a blob: the API may redirect to S3, which
+      // a cross-origin XHR could not follow, and the browser streams to disk
+      window.location.assign(`${API_BASE_URL}/download/${jobId}`);
     } catch (err) {
       setError('Failed to download video');
     }